@@ -1,13 +1,30 @@
 from flask import Flask, request, jsonify, send_file
 from werkzeug.utils import secure_filename
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import atexit
+import functools
+import hashlib
+import json
 import shutil
 import tempfile
-import uuid
-import base64
+import threading
+import time
+import queue
+import secrets
 from PIL import Image
 import io
 import os
+import zipfile
+
+try:
+    # pybase64 dispatches to SIMD libbase64 kernels and returns str directly
+    from pybase64 import b64encode_as_string
+except ImportError:
+    import base64
+
+    def b64encode_as_string(data):
+        return base64.b64encode(data).decode('ascii')
 
 from simple import FortuneTellerProcessor
 
@@ -18,53 +35,280 @@ TEMP_DIR = Path(tempfile.gettempdir()) / "fortune_teller"
 TEMP_DIR.mkdir(exist_ok=True)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+# Let a fronting web server (Apache mod_xsendfile, lighttpd) stream raw PNGs via
+# X-Sendfile; otherwise send_file hands the open file to the WSGI server's
+# file_wrapper, which gunicorn serves with sendfile(2)
+app.config['USE_X_SENDFILE'] = os.getenv('USE_X_SENDFILE') == '1'
+
+ALLOWED_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+UPLOAD_BUFFER_SIZE = 4 * 1024 * 1024  # copy uploads to disk in 4MB chunks
+PNG_DATA_URI_PREFIX = "data:image/png;base64,"
+
+# On-disk cache of extracted segments, keyed by a hash of the upload; kept outside
+# TEMP_DIR so session cleanup can never remove it
+SEGMENT_CACHE_DIR = Path(tempfile.gettempdir()) / "fortune_teller_cache"
+SEGMENT_CACHE_DIR.mkdir(exist_ok=True)
+SEGMENT_CACHE_MAX_ENTRIES = 64
+SEGMENT_CACHE_MAX_AGE = 60 * 60  # seconds
+SEGMENT_CACHE_REAP_INTERVAL = 60  # seconds
+SEGMENT_CACHE_REAPER_LOCK = threading.Lock()
+SEGMENT_CACHE_REAPER_STARTED = False
+
+# Pre-created session directories, topped up in the background
+SESSION_POOL = queue.Queue(maxsize=32)
+SESSION_POOL_LOCK = threading.Lock()
+SESSION_POOL_STARTED = False
+SESSION_POOL_CLOSED = threading.Event()
+
+# Session directories waiting to be removed by the cleanup worker
+CLEANUP_QUEUE = queue.Queue()
+CLEANUP_WORKER_LOCK = threading.Lock()
+CLEANUP_WORKER_STARTED = False
+
+# Shared pool for per-segment base64 encoding (pybase64 releases the GIL)
+ENCODE_POOL = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+def png_data_uri(data):
+    """Encode raw PNG bytes as a data URI in a single string allocation"""
+    return PNG_DATA_URI_PREFIX + b64encode_as_string(data)
+
+@functools.lru_cache(maxsize=4)
+def get_processor(template_size):
+    """Return a shared reconstruction processor for the given template size"""
+    return FortuneTellerProcessor(template_size=template_size)
+
 def allowed_file(filename):
     """Check if file extension is allowed"""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'png', 'jpg', 'jpeg'}
+    return filename.lower().endswith(ALLOWED_EXTENSIONS)
+
+def load_uploaded_images(files):
+    """Open uploaded images in memory, keyed by their filename without extension"""
+    return {
+        Path(secure_filename(file.filename)).stem: Image.open(file.stream)
+        for file in files
+        if file and allowed_file(file.filename)
+    }
+
+def segments_response(session_id, segments):
+    """
+    Build the segments JSON body directly, skipping json.dumps' per-character escaping.
+    
+    Session IDs are URL-safe tokens, segment IDs are fixed identifiers and data URIs
+    are base64, so none of the pieces ever need escaping.
+    """
+    body = ''.join((
+        '{"session_id":"', session_id, '","segments":{',
+        ','.join(f'"{segment_id}":"{data_uri}"' for segment_id, data_uri in segments.items()),
+        '}}'
+    ))
+    return app.response_class(body, mimetype='application/json')
+
+def reconstruction_response(session_id, output_path):
+    """Return a reconstructed PNG as base64 JSON, or as the raw file with ?format=raw"""
+    if request.args.get('format') == 'raw':
+        response = send_file(output_path, mimetype='image/png', conditional=True)
+        response.headers['X-Session-Id'] = session_id
+        return response
+    
+    # Convert result to base64
+    with open(output_path, "rb") as img_file:
+        img_data = png_data_uri(img_file.read())
+        
+    return jsonify({
+        "session_id": session_id,
+        "image": img_data
+    })
+
+def create_session_dir():
+    """Create an empty working directory and return its session ID"""
+    session_id = secrets.token_urlsafe(12)
+    (TEMP_DIR / session_id).mkdir(parents=True)
+    return session_id
+
+def fill_session_pool():
+    """Keep the session directory pool topped up, blocking while it is full"""
+    while not SESSION_POOL_CLOSED.is_set():
+        try:
+            session_id = create_session_dir()
+        except OSError:
+            # Keep the filler alive; requests fall back to creating their own
+            time.sleep(1)
+            continue
+        SESSION_POOL.put(session_id)
+
+def start_session_pool():
+    """Start the pool filler on first use, so it runs in each worker process"""
+    global SESSION_POOL_STARTED
+    with SESSION_POOL_LOCK:
+        if not SESSION_POOL_STARTED:
+            threading.Thread(target=fill_session_pool, daemon=True).start()
+            SESSION_POOL_STARTED = True
+
+@atexit.register
+def drain_session_pool():
+    """Remove pooled session directories that were never handed out"""
+    SESSION_POOL_CLOSED.set()
+    while True:
+        try:
+            session_id = SESSION_POOL.get_nowait()
+        except queue.Empty:
+            break
+        shutil.rmtree(TEMP_DIR / session_id, ignore_errors=True)
+
+def new_session():
+    """Return (session_id, work_dir) for a new request"""
+    start_session_pool()
+    try:
+        session_id = SESSION_POOL.get_nowait()
+    except queue.Empty:
+        session_id = None
+        
+    # Pooled directories may have been removed along with TEMP_DIR
+    if session_id is None or not (TEMP_DIR / session_id).is_dir():
+        session_id = create_session_dir()
+    return session_id, TEMP_DIR / session_id
+
+def cleanup_worker():
+    """Remove queued session directories off the request thread"""
+    while True:
+        shutil.rmtree(CLEANUP_QUEUE.get(), ignore_errors=True)
 
-@app.route('/api/process', methods=['POST'])
+def start_cleanup_worker():
+    """Start the cleanup worker on first use, so it runs in each worker process"""
+    global CLEANUP_WORKER_STARTED
+    with CLEANUP_WORKER_LOCK:
+        if not CLEANUP_WORKER_STARTED:
+            threading.Thread(target=cleanup_worker, daemon=True).start()
+            CLEANUP_WORKER_STARTED = True
+
+def upload_digest(path):
+    """Hash an uploaded file's contents for use as a cache key"""
+    digest = hashlib.blake2b()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_cached_segments(digest):
+    """Return cached segment data URIs for an upload digest, or None on a miss"""
+    cache_path = SEGMENT_CACHE_DIR / f"{digest}.json"
+    try:
+        with open(cache_path) as f:
+            segments = json.load(f)
+        # Refresh mtime so the reaper treats the entry as recently used
+        os.utime(cache_path)
+    except (OSError, ValueError):
+        return None
+    return segments
+
+def store_cached_segments(digest, segments):
+    """Atomically write segment data URIs to the cache"""
+    cache_path = SEGMENT_CACHE_DIR / f"{digest}.json"
+    tmp_path = SEGMENT_CACHE_DIR / f"{digest}.{secrets.token_hex(4)}.tmp"
+    SEGMENT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    with open(tmp_path, 'w') as f:
+        json.dump(segments, f)
+    os.replace(tmp_path, cache_path)
+    start_cache_reaper()
+
+def reap_segment_cache():
+    """Periodically drop cache entries that are stale or beyond the size bound"""
+    while True:
+        time.sleep(SEGMENT_CACHE_REAP_INTERVAL)
+        entries = []
+        for path in SEGMENT_CACHE_DIR.glob("*.json"):
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except OSError:
+                continue
+                
+        cutoff = time.time() - SEGMENT_CACHE_MAX_AGE
+        entries.sort(reverse=True)
+        for index, (mtime, path) in enumerate(entries):
+            if index >= SEGMENT_CACHE_MAX_ENTRIES or mtime < cutoff:
+                path.unlink(missing_ok=True)
+
+def start_cache_reaper():
+    """Start the cache reaper on first write, so it runs in each worker process"""
+    global SEGMENT_CACHE_REAPER_STARTED
+    with SEGMENT_CACHE_REAPER_LOCK:
+        if not SEGMENT_CACHE_REAPER_STARTED:
+            threading.Thread(target=reap_segment_cache, daemon=True).start()
+            SEGMENT_CACHE_REAPER_STARTED = True
+
+def allowed_image(path):
+    """Check the file header to make sure it is a supported image"""
+    try:
+        with Image.open(path) as img:
+            return img.format in {'PNG', 'JPEG'}
+    except Exception:
+        return False
+
+@app.route('/api/process', methods=['POST', 'PUT'])
 def process_image():
     """Process uploaded fortune teller image and return extracted segments"""
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'No file provided'}), 400
-            
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
-            
-        if not allowed_file(file.filename):
-            return jsonify({'error': 'Invalid file type'}), 400
+        # Raw uploads are streamed straight to disk, bypassing multipart parsing
+        raw_upload = request.mimetype == 'application/octet-stream'
+        
+        if not raw_upload:
+            if 'file' not in request.files:
+                return jsonify({'error': 'No file provided'}), 400
+                
+            file = request.files['file']
+            if file.filename == '':
+                return jsonify({'error': 'No file selected'}), 400
+                
+            if not allowed_file(file.filename):
+                return jsonify({'error': 'Invalid file type'}), 400
 
-        # Create unique working directory
-        session_id = str(uuid.uuid4())
-        work_dir = TEMP_DIR / session_id
-        work_dir.mkdir(parents=True)
+        # Take a unique working directory, pre-created where possible
+        session_id, work_dir = new_session()
         
         # Save uploaded file
         input_path = work_dir / "input.png"
-        file.save(str(input_path))
+        if raw_upload:
+            with open(input_path, 'wb') as out:
+                shutil.copyfileobj(request.stream, out, length=UPLOAD_BUFFER_SIZE)
+                
+            if not allowed_image(input_path):
+                shutil.rmtree(work_dir)
+                return jsonify({'error': 'Invalid file type'}), 400
+        else:
+            file.save(input_path, buffer_size=UPLOAD_BUFFER_SIZE)
+        
+        # Identical uploads (e.g. UI retries) are answered from the cache
+        zip_response = request.args.get('format') == 'zip'
+        if not zip_response:
+            digest = upload_digest(input_path)
+            cached = load_cached_segments(digest)
+            if cached is not None:
+                return segments_response(session_id, cached)
         
         # Process image
-        processor = FortuneTellerProcessor(str(input_path))
-        output_dir = work_dir / "segments"
-        output_dir.mkdir()
-        
-        # Extract segments
-        processor.extract_all(str(output_dir))
-        
-        # Convert extracted images to base64
-        results = {}
-        for segment_path in output_dir.glob("*.png"):
-            segment_id = segment_path.stem
-            with open(segment_path, "rb") as img_file:
-                img_data = base64.b64encode(img_file.read()).decode()
-                results[segment_id] = f"data:image/png;base64,{img_data}"
-        
-        return jsonify({
-            "session_id": session_id,
-            "segments": results
-        })
+        processor = FortuneTellerProcessor(input_path)
+        
+        # Raw PNGs bundled in a ZIP skip the base64 pass entirely
+        if zip_response:
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+                for segment_id, png_data in processor.extract_all_to_memory():
+                    archive.writestr(f"{segment_id}.png", png_data)
+            buffer.seek(0)
+            
+            response = send_file(buffer, mimetype='application/zip', 
+                                 download_name='segments.zip')
+            response.headers['X-Session-Id'] = session_id
+            return response
+        
+        # Extract segments in memory and convert them to base64 in parallel
+        results = dict(ENCODE_POOL.map(
+            lambda segment: (segment[0], png_data_uri(segment[1])),
+            processor.extract_all_to_memory()
+        ))
+        store_cached_segments(digest, results)
+        
+        return segments_response(session_id, results)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -77,35 +321,19 @@ def reconstruct_image():
         if not files:
             return jsonify({'error': 'No files provided'}), 400
 
-        # Create unique working directory
-        session_id = str(uuid.uuid4())
-        work_dir = TEMP_DIR / session_id
-        work_dir.mkdir(parents=True)
-        
-        # Save uploaded files
-        input_dir = work_dir / "input"
-        input_dir.mkdir()
+        # Take a unique working directory, pre-created where possible
+        session_id, work_dir = new_session()
         
-        for file in files:
-            if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                file_path = input_dir / filename
-                file.save(str(file_path))
+        # Decode uploaded segments straight from the request
+        images = load_uploaded_images(files)
         
         # Process reconstruction
-        processor = FortuneTellerProcessor(template_size=800)
+        processor = get_processor(800)
         output_path = work_dir / "reconstructed.png"
         
-        reconstructed = processor.reconstruct(str(input_dir), str(output_path))
+        reconstructed = processor.reconstruct_from_images(images, output_path)
         
-        # Convert result to base64
-        with open(output_path, "rb") as img_file:
-            img_data = base64.b64encode(img_file.read()).decode()
-            
-        return jsonify({
-            "session_id": session_id,
-            "image": f"data:image/png;base64,{img_data}"
-        })
+        return reconstruction_response(session_id, output_path)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -116,8 +344,9 @@ def cleanup_session(session_id):
     try:
         session_dir = TEMP_DIR / session_id
         if session_dir.exists():
-            shutil.rmtree(session_dir)
-        return jsonify({"status": "success"})
+            CLEANUP_QUEUE.put(session_dir)
+            start_cleanup_worker()
+        return jsonify({"status": "queued"}), 202
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -129,40 +358,23 @@ def reconstruct_from_composites():
         if not files:
             return jsonify({'error': 'No files provided'}), 400
 
-        # Create unique working directory
-        session_id = str(uuid.uuid4())
-        work_dir = TEMP_DIR / session_id
-        work_dir.mkdir(parents=True)
+        # Take a unique working directory, pre-created where possible
+        session_id, work_dir = new_session()
         
-        # Create composites directory
-        composites_dir = work_dir / "composites"
-        composites_dir.mkdir()
-        
-        # Save uploaded composite files
-        for file in files:
-            if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                file_path = composites_dir / filename
-                file.save(str(file_path))
+        # Decode uploaded composites straight from the request
+        composites = load_uploaded_images(files)
         
         # Process reconstruction
-        processor = FortuneTellerProcessor(template_size=800)
+        processor = get_processor(800)
         output_path = work_dir / "reconstructed.png"
         
-        # Use reconstruct_from_composites instead of reconstruct
-        reconstructed = processor.reconstruct_from_composites(
-            str(composites_dir),
-            str(output_path)
+        # Use reconstruct_from_composite_images instead of reconstruct_from_images
+        reconstructed = processor.reconstruct_from_composite_images(
+            composites,
+            output_path
         )
         
-        # Convert result to base64
-        with open(output_path, "rb") as img_file:
-            img_data = base64.b64encode(img_file.read()).decode()
-            
-        return jsonify({
-            "session_id": session_id,
-            "image": f"data:image/png;base64,{img_data}"
-        })
+        return reconstruction_response(session_id, output_path)
         
     except Exception as e:
         print (str(e))
@@ -172,9 +384,13 @@ def reconstruct_from_composites():
 def add_cors_headers(response):
     """Add CORS headers to allow frontend requests"""
     response.headers['Access-Control-Allow-Origin'] = '*'
-    response.headers['Access-Control-Allow-Methods'] = 'POST, GET, DELETE, OPTIONS'
+    response.headers['Access-Control-Allow-Methods'] = 'POST, PUT, GET, DELETE, OPTIONS'
     response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
+    response.headers['Access-Control-Expose-Headers'] = 'X-Session-Id'
     return response
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000,host = '0.0.0.0' )
+    if os.getenv('DEV'):
+        app.run(debug=True, port=5000,host = '0.0.0.0' )
+    else:
+        print("Set DEV=1 to run the development server, or serve wsgi:app with gunicorn (see README)")
@@ -1,17 +1,47 @@
 from pathlib import Path
-from PIL import Image, ImageDraw
+from PIL import Image, ImageDraw, UnidentifiedImageError
+import functools
+import io
+import logging
+import mmap
+import os
 import numpy as np
-from typing import Tuple, List, Dict, Optional
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple, List, Dict, Optional, Iterator, Union
+from dataclasses import dataclass, field
 from enum import Enum, auto
 
+try:
+    # libvips decodes PNGs through libspng, well ahead of Pillow's zlib path
+    import pyvips
+except (ImportError, OSError):
+    # OSError: the binding is installed but libvips itself is missing
+    pyvips = None
+
+# Anything accepted where a filesystem path is expected
+PathLike = Union[str, os.PathLike]
+
+logger = logging.getLogger(__name__)
+
+def _ensure_rgba(image: Image.Image) -> Image.Image:
+    """Return image in RGBA mode, converting (and so copying) only when it is not already."""
+    return image if image.mode == 'RGBA' else image.convert('RGBA')
+
+# Scale and offset tweaks applied to segments by the corner they sit in
+CORNER_ADJUSTMENTS = {
+    'top_left': {'scale': 1.01, 'offset': (0.01, 0.01)},
+    'top_right': {'scale': 1.01, 'offset': (-0.01, 0.01)},
+    'bottom_left': {'scale': 1.01, 'offset': (0.01, -0.01)},
+    'bottom_right': {'scale': 1.01, 'offset': (-0.01, -0.01)},
+}
+
 class AnchorPoint(Enum):
     TOP_LEFT = "top_left"
     TOP_RIGHT = "top_right"
     BOTTOM_LEFT = "bottom_left"
     BOTTOM_RIGHT = "bottom_right"
 
-@dataclass
+@dataclass(frozen=True)
 class SegmentDefinition:
     """Defines a segment's properties for both extraction and reconstruction"""
     points: List[Tuple[int, int]]  # Grid coordinates
@@ -19,6 +49,14 @@ class SegmentDefinition:
     default_rotation: float = 0    # Default rotation when reconstructing
     scale: float = 1.0            # Add this line: scaling factor
     offset: Tuple[float, float] = (0.0, 0.0)  # Add this line: (x,y) offset
+    mins: Tuple[int, int] = field(init=False, repr=False, compare=False)  # (min_x, min_y) of points
+    maxs: Tuple[int, int] = field(init=False, repr=False, compare=False)  # (max_x, max_y) of points
+    
+    def __post_init__(self):
+        # Cache the grid bounding box once; definitions are immutable
+        points = np.asarray(self.points)
+        object.__setattr__(self, 'mins', tuple(points.min(axis=0).tolist()))
+        object.__setattr__(self, 'maxs', tuple(points.max(axis=0).tolist()))
 
 class SplitType(Enum):
     DIAGONAL = auto()  # For option pairs that meet at diagonal
@@ -40,6 +78,15 @@ class CompositeDefinition:
     split_rotation: float = 0    # For DIAGONAL splits
     regions: List[SplitRegion] = None  # For GRID or CUSTOM splits
 
+@dataclass(frozen=True)
+class SegmentGeometry:
+    """Size-dependent placement data for a segment, precomputed once per processor"""
+    grid_bbox: Tuple[int, int, int, int]  # (min_x, min_y, max_x, max_y) in grid coordinates
+    anchor: Tuple[int, int]               # Anchor point in grid coordinates
+    target_size: Tuple[int, int]          # Placed (width, height) in pixels, scale applied
+    pixel_anchor: Tuple[int, int]         # Placement position in pixels, scale and offset applied
+    grid_points: np.ndarray               # (N, 3) homogeneous grid coordinates of the polygon
+
 class FortuneTellerProcessor:
     """
     A unified processor for fortune teller images that handles both
@@ -51,57 +98,69 @@ class FortuneTellerProcessor:
         'option_1': SegmentDefinition(
             points=[(1,0), (1,1), (2,0)],
             anchor_point=AnchorPoint.TOP_LEFT,
-            default_rotation=90
+            default_rotation=90,
+            **CORNER_ADJUSTMENTS['top_left']
         ),
         'option_2': SegmentDefinition(
             points=[(2,0), (3,0), (3,1)],
             anchor_point=AnchorPoint.TOP_LEFT,
-            default_rotation=-90
+            default_rotation=-90,
+            **CORNER_ADJUSTMENTS['top_right']
         ),
         'option_3': SegmentDefinition(
             points=[(3,1), (4,1), (4,2)],
             anchor_point=AnchorPoint.TOP_LEFT,
-            default_rotation=90
+            default_rotation=90,
+            **CORNER_ADJUSTMENTS['top_right']
         ),
         'option_4': SegmentDefinition(
             points=[(3,3), (4,2), (4,3)],
             anchor_point=AnchorPoint.TOP_LEFT,
-            default_rotation=-180
+            default_rotation=-180,
+            **CORNER_ADJUSTMENTS['bottom_right']
         ),
         'option_5': SegmentDefinition(
             points=[(2,4), (3,3), (3,4)],
-            anchor_point=AnchorPoint.TOP_LEFT
+            anchor_point=AnchorPoint.TOP_LEFT,
+            **CORNER_ADJUSTMENTS['bottom_right']
         ),
         'option_6': SegmentDefinition(
             points=[(1,3), (1,4), (2,4)],
-            anchor_point=AnchorPoint.TOP_LEFT
+            anchor_point=AnchorPoint.TOP_LEFT,
+            **CORNER_ADJUSTMENTS['bottom_left']
         ),
         'option_7': SegmentDefinition(
             points=[(0,2), (0,3), (1,3)],
             anchor_point=AnchorPoint.TOP_LEFT,
-            default_rotation=-90
+            default_rotation=-90,
+            **CORNER_ADJUSTMENTS['bottom_left']
         ),
         'option_8': SegmentDefinition(
             points=[(0,1), (0,2), (1,1)],
-            anchor_point=AnchorPoint.TOP_LEFT
+            anchor_point=AnchorPoint.TOP_LEFT,
+            **CORNER_ADJUSTMENTS['top_left']
         ),
         
         # Flaps - labeled clockwise from top left
         'flap_A': SegmentDefinition(
             points=[(0,0), (1,0), (1,1), (0,1)],
-            anchor_point=AnchorPoint.TOP_LEFT
+            anchor_point=AnchorPoint.TOP_LEFT,
+            **CORNER_ADJUSTMENTS['top_left']
         ),
         'flap_B': SegmentDefinition(
             points=[(3,0), (4,0), (4,1), (3,1)],
-            anchor_point=AnchorPoint.TOP_LEFT
+            anchor_point=AnchorPoint.TOP_LEFT,
+            **CORNER_ADJUSTMENTS['top_right']
         ),
         'flap_C': SegmentDefinition(
             points=[(3,3), (4,3), (4,4), (3,4)],
-            anchor_point=AnchorPoint.TOP_LEFT
+            anchor_point=AnchorPoint.TOP_LEFT,
+            **CORNER_ADJUSTMENTS['bottom_right']
         ),
         'flap_D': SegmentDefinition(
             points=[(0,3), (1,3), (1,4), (0,4)],
-            anchor_point=AnchorPoint.TOP_LEFT
+            anchor_point=AnchorPoint.TOP_LEFT,
+            **CORNER_ADJUSTMENTS['bottom_left']
         ),
         # Adding definition for big diamond
         'big_diamond': SegmentDefinition(
@@ -153,21 +212,44 @@ class FortuneTellerProcessor:
     }
 
 
-    def __init__(self, image_path: Optional[str] = None, template_size: int = 400):
-        """Initialize processor with either an input image or template size."""
+    # Counter-clockwise rotations that map exactly onto a transpose
+    RIGHT_ANGLE_TRANSPOSES = {
+        90: Image.Transpose.ROTATE_90,
+        180: Image.Transpose.ROTATE_180,
+        270: Image.Transpose.ROTATE_270,
+    }
+
+    # Alpha lookup table: below 128 becomes fully transparent, the rest fully opaque
+    BINARY_ALPHA_LUT = [0] * 128 + [255] * 128
+
+    # Filters Image.transform accepts; others place segments via rotate then resize
+    AFFINE_RESAMPLING = (
+        Image.Resampling.NEAREST,
+        Image.Resampling.BILINEAR,
+        Image.Resampling.BICUBIC,
+    )
+    
+    # Image.transform does not antialias, so segments shrunk by more than this factor
+    # are placed via rotate then resize instead
+    MAX_AFFINE_DOWNSCALE = 2
+
+    def __init__(self, image_path: Optional[PathLike] = None, template_size: int = 400,
+                 resample: Image.Resampling = Image.Resampling.BILINEAR):
+        """
+        Initialize processor with either an input image or template size.
+        
+        resample is the filter used when resizing segments for reconstruction. Segments
+        extracted at the template size only change scale by the small CORNER_ADJUSTMENTS
+        tweaks, where BILINEAR is visually indistinguishable from LANCZOS at a fraction of
+        the cost. Uploaded segments and diagonal halves can need much larger scale changes;
+        pass LANCZOS for sharper output there.
+        """
         self.size = template_size
+        self.resample = resample
         self.grid_size = self.size / 4
         
-        # Add these corner adjustments
-        self.corner_adjustments = {
-            'top_left': {'scale': 1.01, 'offset': (0.01, 0.01)},
-            'top_right': {'scale': 1.01, 'offset': (-0.01, 0.01)},
-            'bottom_left': {'scale': 1.01, 'offset': (0.01, -0.01)},
-            'bottom_right': {'scale': 1.01, 'offset': (-0.01, -0.01)},
-        }
-        
         if image_path:
-            self.image = Image.open(image_path)
+            self.image = self.open_image(image_path)
             size = min(self.image.size)
             self.image = self.image.resize((size, size))
             self.size = self.image.width
@@ -175,86 +257,59 @@ class FortuneTellerProcessor:
             
         self.debug_dir = None
         
-        # Initialize segments with corner adjustments
-        self._initialize_segment_defs()
-
-
-    def _initialize_segment_defs(self):
-        """Initialize segment definitions with scaling and offsets"""
-        self.SEGMENT_DEFS = {
-            'option_1': SegmentDefinition(
-                points=[(1,0), (1,1), (2,0)],
-                anchor_point=AnchorPoint.TOP_LEFT,
-                default_rotation=90,
-                **self.corner_adjustments['top_left']
-            ),
-            'option_2': SegmentDefinition(
-                points=[(2,0), (3,0), (3,1)],
-                anchor_point=AnchorPoint.TOP_LEFT,
-                default_rotation=-90,
-                **self.corner_adjustments['top_right']
-            ),
-            'option_3': SegmentDefinition(
-                points=[(3,1), (4,1), (4,2)],
-                anchor_point=AnchorPoint.TOP_LEFT,
-                default_rotation=90,
-                **self.corner_adjustments['top_right']
-            ),
-            'option_4': SegmentDefinition(
-                points=[(3,3), (4,2), (4,3)],
-                anchor_point=AnchorPoint.TOP_LEFT,
-                default_rotation=-180,
-                **self.corner_adjustments['bottom_right']
-            ),
-            'option_5': SegmentDefinition(
-                points=[(2,4), (3,3), (3,4)],
-                anchor_point=AnchorPoint.TOP_LEFT,
-                **self.corner_adjustments['bottom_right']
-            ),
-            'option_6': SegmentDefinition(
-                points=[(1,3), (1,4), (2,4)],
-                anchor_point=AnchorPoint.TOP_LEFT,
-                **self.corner_adjustments['bottom_left']
-            ),
-            'option_7': SegmentDefinition(
-                points=[(0,2), (0,3), (1,3)],
-                anchor_point=AnchorPoint.TOP_LEFT,
-                default_rotation=-90,
-                **self.corner_adjustments['bottom_left']
-            ),
-            'option_8': SegmentDefinition(
-                points=[(0,1), (0,2), (1,1)],
-                anchor_point=AnchorPoint.TOP_LEFT,
-                **self.corner_adjustments['top_left']
-            ),
-            'flap_A': SegmentDefinition(
-                points=[(0,0), (1,0), (1,1), (0,1)],
-                anchor_point=AnchorPoint.TOP_LEFT,
-                **self.corner_adjustments['top_left']
-            ),
-            'flap_B': SegmentDefinition(
-                points=[(3,0), (4,0), (4,1), (3,1)],
-                anchor_point=AnchorPoint.TOP_LEFT,
-                **self.corner_adjustments['top_right']
-            ),
-            'flap_C': SegmentDefinition(
-                points=[(3,3), (4,3), (4,4), (3,4)],
-                anchor_point=AnchorPoint.TOP_LEFT,
-                **self.corner_adjustments['bottom_right']
-            ),
-            'flap_D': SegmentDefinition(
-                points=[(0,3), (1,3), (1,4), (0,4)],
-                anchor_point=AnchorPoint.TOP_LEFT,
-                **self.corner_adjustments['bottom_left']
-            ),
-            'big_diamond': SegmentDefinition(
-                points=[(1,1), (3,1), (3,3), (1,3)],
-                anchor_point=AnchorPoint.TOP_LEFT,
-                scale=1.0,
-                offset=(0.0, 0.0)
-            ),
-        }
+        # Segment definitions are shared; only their pixel geometry depends on size
+        self._initialize_segment_geometry()
+
+    def _initialize_segment_geometry(self):
+        """Precompute bounding boxes, anchors and placement sizes for every segment"""
+        # Affine grid -> pixel transform in homogeneous coordinates
+        cell = self.size / 4
+        self.grid_matrix = np.array([
+            [cell, 0, 0],
+            [0, cell, 0],
+            [0, 0, 1],
+        ])
+        
+        self.segment_geometry = {}
+        
+        # Extraction masks depend only on geometry, so they are drawn once and reused;
+        # extracted segments are kept too, since composites re-extract the same ones
+        self._mask_cache = {}
+        self._segment_cache = {}
+        for segment_id, segment_def in self.SEGMENT_DEFS.items():
+            points = segment_def.points
+            min_x, min_y = segment_def.mins
+            max_x, max_y = segment_def.maxs
+            
+            # The big diamond is never scaled (see grid_to_pixel)
+            scale = 1.0 if segment_id == 'big_diamond' else segment_def.scale
+            target_width = int((max_x - min_x) * self.size * scale / 4)
+            target_height = int((max_y - min_y) * self.size * scale / 4)
+            
+            grid_x, grid_y = self.get_anchor_coordinates(segment_def)
+            self.segment_geometry[segment_id] = SegmentGeometry(
+                grid_bbox=(min_x, min_y, max_x, max_y),
+                anchor=(grid_x, grid_y),
+                target_size=(target_width, target_height),
+                pixel_anchor=self.grid_to_pixel(grid_x, grid_y, segment_id),
+                grid_points=np.array([(x, y, 1) for x, y in points], dtype=np.float64)
+            )
 
+    def grid_to_pixels(self, segment_id: str) -> np.ndarray:
+        """
+        Convert all polygon vertices of a segment to pixel coordinates in one matmul.
+        
+        Matches grid_to_pixel without a segment ID, i.e. the unscaled positions
+        used for extraction.
+        
+        Args:
+            segment_id: ID of the segment whose polygon to convert
+            
+        Returns:
+            (N, 2) int32 array of pixel coordinates
+        """
+        points = self.segment_geometry[segment_id].grid_points
+        return (points @ self.grid_matrix.T).astype(np.int32)[:, :2]
 
     def grid_to_pixel(self, x: float, y: float, segment_id: str = None) -> Tuple[int, int]:
         """Convert grid coordinates to pixel coordinates with scaling and offset"""
@@ -281,43 +336,90 @@ class FortuneTellerProcessor:
 
     def place_segment(self, template: Image.Image, segment: Image.Image, 
                      segment_id: str) -> Image.Image:
-        """Place a segment using its definition with scaling and offset."""
+        """Place a segment using its definition with scaling and offset; the template is modified in place."""
         segment_def = self.SEGMENT_DEFS[segment_id]
+        geometry = self.segment_geometry[segment_id]
         
-        # Apply default rotation if specified
-        if segment_def.default_rotation != 0:
-            segment = self.rotate_segment(segment, segment_def.default_rotation)
+        # Placement coordinates and target size are precomputed with scaling/offset
+        px, py = geometry.pixel_anchor
+        target_width, target_height = geometry.target_size
         
-        # Get placement coordinates with segment ID for scaling/offset
-        grid_x, grid_y = self.get_anchor_coordinates(segment_def)
-        px, py = self.grid_to_pixel(grid_x, grid_y, segment_id)
-        
-        # Calculate target size with scaling
-        points = segment_def.points
-        min_x = min(p[0] for p in points)
-        max_x = max(p[0] for p in points)
-        min_y = min(p[1] for p in points)
-        max_y = max(p[1] for p in points)
-        
-        # Apply scaling to target size for non-diamond segments
-        if segment_id != 'big_diamond':
-            target_width = int((max_x - min_x) * self.size * segment_def.scale / 4)
-            target_height = int((max_y - min_y) * self.size * segment_def.scale / 4)
+        # Size of the segment once rotated, to compare against the placed size
+        if segment_def.default_rotation % 180 == 90:
+            rotated_height, rotated_width = segment.size
         else:
-            target_width = int((max_x - min_x) * self.size / 4)
-            target_height = int((max_y - min_y) * self.size / 4)
+            rotated_width, rotated_height = segment.size
         
-        # Resize segment to match target size
-        if target_width > 0 and target_height > 0:
-            segment = segment.resize((target_width, target_height), Image.Resampling.LANCZOS)
+        affine = None
+        if (target_width > 0 and target_height > 0 and self.resample in self.AFFINE_RESAMPLING
+                and rotated_width <= target_width * self.MAX_AFFINE_DOWNSCALE
+                and rotated_height <= target_height * self.MAX_AFFINE_DOWNSCALE):
+            affine = self._placement_affine(segment.size, segment_def.default_rotation, 
+                                            geometry.target_size)
+        
+        segment = _ensure_rgba(segment)
+            
+        if affine is not None:
+            # Rotate and resize in a single resampling pass, skipped entirely when the
+            # segment already has its placed size and orientation (e.g. split grid regions)
+            if segment.size != geometry.target_size or segment_def.default_rotation % 360 != 0:
+                segment = segment.transform(geometry.target_size, Image.Transform.AFFINE, 
+                                            affine, self.resample)
+        else:
+            # Apply default rotation if specified
+            segment = self.rotate_segment(segment, segment_def.default_rotation)
+            
+            # Resize segment to match target size
+            if target_width > 0 and target_height > 0:
+                segment = segment.resize((target_width, target_height), self.resample)
         
         if template is None:
             template = Image.new('RGBA', (self.size, self.size), (0, 0, 0, 0))
         
-        result = template.copy()
-        result.alpha_composite(segment, (px, py))
+        template.alpha_composite(segment, (px, py))
         
-        return result
+        return template
+
+    @classmethod
+    def _placement_affine(cls, source_size: Tuple[int, int], angle: float, 
+                          target_size: Tuple[int, int]) -> Optional[Tuple[float, ...]]:
+        """
+        Build PIL AFFINE data that rotates a segment and stretches it to target_size.
+        
+        Equivalent to rotate_segment followed by resize, but resampled once. Only right-angle
+        rotations map to a plain affine (others also crop to content), so any other
+        angle returns None.
+        
+        Args:
+            source_size: (width, height) of the unrotated segment
+            angle: Counter-clockwise rotation in degrees
+            target_size: (width, height) of the placed segment
+            
+        Returns:
+            (a, b, c, d, e, f) mapping output pixels back to source pixels, or None
+        """
+        angle = angle % 360
+        if angle != 0 and angle not in cls.RIGHT_ANGLE_TRANSPOSES:
+            return None
+            
+        width, height = source_size
+        if angle in (90, 270):
+            rotated_width, rotated_height = height, width
+        else:
+            rotated_width, rotated_height = width, height
+            
+        # Forward map: rotate about the source centre into the rotated frame, then scale
+        cos_a = round(np.cos(np.radians(angle)))
+        sin_a = round(np.sin(np.radians(angle)))
+        to_origin = np.array([[1, 0, -width / 2], [0, 1, -height / 2], [0, 0, 1]])
+        rotate = np.array([[cos_a, sin_a, 0], [-sin_a, cos_a, 0], [0, 0, 1]])
+        to_rotated = np.array([[1, 0, rotated_width / 2], [0, 1, rotated_height / 2], [0, 0, 1]])
+        scale = np.diag([target_size[0] / rotated_width, target_size[1] / rotated_height, 1])
+        forward = scale @ to_rotated @ rotate @ to_origin
+        
+        # PIL wants the inverse (output -> input) as the top two rows
+        inverse = np.linalg.inv(forward)
+        return tuple(inverse[:2].ravel().tolist())
 
     def combine_segments_tight(self, segment1: Image.Image, segment2: Image.Image) -> Image.Image:
         """Combine two segments tightly together for diagonal compositions."""
@@ -357,10 +459,8 @@ class FortuneTellerProcessor:
             segment1 = self.extract_segment(f'option_{option1}')
             segment2 = self.extract_segment(f'option_{option2}')
             
-            if rotation1 != 0:
-                segment1 = self.rotate_segment(segment1, rotation1)
-            if rotation2 != 0:
-                segment2 = self.rotate_segment(segment2, rotation2)
+            segment1 = self.rotate_segment(segment1, rotation1)
+            segment2 = self.rotate_segment(segment2, rotation2)
             
             return self.combine_segments_tight(segment1, segment2)
         except Exception as e:
@@ -369,30 +469,25 @@ class FortuneTellerProcessor:
 
 
 
-    def extract_big_diamond(self, output_path: Optional[str] = None) -> Image:
+    def extract_big_diamond(self, output_path: Optional[PathLike] = None) -> Image:
         """Extract the central diamond region."""
         if not hasattr(self, 'image'):
             raise ValueError("No input image loaded for extraction")
             
-        mask = Image.new('L', (self.size, self.size), 0)
-        draw = ImageDraw.Draw(mask)
-        
-        points = [
-            self.grid_to_pixel(x, y) for x,y in self.SEGMENT_DEFS['big_diamond'].points
-        ]
-        draw.polygon(points, fill=255)
+        points = self.grid_to_pixels('big_diamond')
         
-        result = Image.new('RGBA', (self.size, self.size), (0, 0, 0, 0))
-        result.paste(self.image, mask=mask)
-        
-        result = self.crop_to_content(result)
+        # The filled polygon includes its far edges, so the tight box extends one pixel past them
+        left, top = points.min(axis=0).tolist()
+        right, bottom = points.max(axis=0).tolist()
+        bbox = (left, top, min(right + 1, self.size), min(bottom + 1, self.size))
+        result = self._extract_polygon('big_diamond', bbox)
         
         if output_path:
             result.save(output_path)
             
         return result
 
-    def extract_all(self, output_dir: str = '.'):
+    def extract_all(self, output_dir: PathLike = '.', compress_level: int = 6):
         """Extract all segments to specified directory."""
         if not hasattr(self, 'image'):
             raise ValueError("No input image loaded for extraction")
@@ -400,12 +495,45 @@ class FortuneTellerProcessor:
         output_path = Path(output_dir)
         output_path.mkdir(parents=True, exist_ok=True)
         
-        for segment_id in self.SEGMENT_DEFS:
-            self.extract_segment(segment_id, output_path / f'{segment_id}.png')
+        def extract(segment_id):
+            if segment_id == 'big_diamond':
+                segment = self.extract_big_diamond()
+            else:
+                segment = self.extract_segment(segment_id)
+            segment.save(output_path / f'{segment_id}.png', 'PNG', 
+                         compress_level=compress_level, optimize=False)
+        
+        # Segments cover disjoint polygons, so they are extracted and encoded in parallel
+        self._parallel_map(extract, self.SEGMENT_DEFS)
+
+    def extract_all_to_memory(self, compress_level: int = 1, 
+                              palette: bool = True) -> Iterator[Tuple[str, bytes]]:
+        """
+        Extract all segments as in-memory PNG bytes, yielding (segment_id, png_bytes).
         
-        self.extract_big_diamond(output_path / 'big_diamond.png')
+        Defaults to a low zlib level since the output is usually base64-inlined
+        straight away rather than stored. Segments with few enough colors are
+        written as palette PNGs when `palette` is set.
+        """
+        if not hasattr(self, 'image'):
+            raise ValueError("No input image loaded for extraction")
+            
+        for segment_id in self.SEGMENT_DEFS:
+            if segment_id == 'big_diamond':
+                segment = self.extract_big_diamond()
+            else:
+                segment = self.extract_segment(segment_id)
+            
+            if palette:
+                paletted = self.to_palette(segment)
+                if paletted is not None:
+                    segment = paletted
+            
+            buffer = io.BytesIO()
+            segment.save(buffer, 'PNG', compress_level=compress_level, optimize=False)
+            yield segment_id, buffer.getvalue()
     
-    def enable_debug(self, debug_dir: str):
+    def enable_debug(self, debug_dir: PathLike):
         """Enable debug output to specified directory."""
         self.debug_dir = Path(debug_dir)
         self.debug_dir.mkdir(parents=True, exist_ok=True)
@@ -419,18 +547,47 @@ class FortuneTellerProcessor:
     
     def get_anchor_coordinates(self, segment_def: SegmentDefinition) -> Tuple[int, int]:
         """Get the anchor point coordinates based on segment definition."""
-        points = segment_def.points
+        (min_x, min_y), (max_x, max_y) = segment_def.mins, segment_def.maxs
         if segment_def.anchor_point == AnchorPoint.TOP_LEFT:
-            return min(p[0] for p in points), min(p[1] for p in points)
+            return min_x, min_y
         elif segment_def.anchor_point == AnchorPoint.TOP_RIGHT:
-            return max(p[0] for p in points), min(p[1] for p in points)
+            return max_x, min_y
         elif segment_def.anchor_point == AnchorPoint.BOTTOM_LEFT:
-            return min(p[0] for p in points), max(p[1] for p in points)
+            return min_x, max_y
         else:  # BOTTOM_RIGHT
-            return max(p[0] for p in points), max(p[1] for p in points)
+            return max_x, max_y
     
-    def extract_segment(self, segment_id: str, output_path: Optional[str] = None) -> Image:
-        """Extract a segment using its definition."""
+    def _polygon_mask(self, segment_id: str, bbox: Tuple[int, int, int, int]) -> Image.Image:
+        """Return a segment's polygon mask in bbox-local coordinates, drawing it on first use."""
+        key = (segment_id, bbox)
+        mask = self._mask_cache.get(key)
+        if mask is None:
+            left, top, right, bottom = bbox
+            mask = Image.new('L', (right - left, bottom - top), 0)
+            draw = ImageDraw.Draw(mask)
+            draw.polygon((self.grid_to_pixels(segment_id) - (left, top)).ravel().tolist(), fill=255)
+            self._mask_cache[key] = mask
+        return mask
+
+    def _extract_polygon(self, segment_id: str, 
+                         bbox: Tuple[int, int, int, int]) -> Image.Image:
+        """
+        Cut a segment's polygon out of the source image, touching only its bounding box.
+        
+        Results are cached per processor and shared between callers, so copy one
+        before modifying it in place.
+        """
+        key = (segment_id, bbox)
+        result = self._segment_cache.get(key)
+        if result is None:
+            mask = self._polygon_mask(segment_id, bbox)
+            result = Image.new('RGBA', mask.size, (0, 0, 0, 0))
+            result.paste(self.image.crop(bbox), mask=mask)
+            self._segment_cache[key] = result
+        return result
+
+    def extract_segment(self, segment_id: str, output_path: Optional[PathLike] = None) -> Image:
+        """Extract a segment using its definition; the result is cached, so copy it before editing."""
         if not hasattr(self, 'image'):
             raise ValueError("No input image loaded for extraction")
             
@@ -438,22 +595,9 @@ class FortuneTellerProcessor:
         if not segment_def:
             raise ValueError(f"Invalid segment ID: {segment_id}")
         
-        pixel_points = [self.grid_to_pixel(x, y) for x, y in segment_def.points]
-        
-        mask = Image.new('L', (self.size, self.size), 0)
-        draw = ImageDraw.Draw(mask)
-        draw.polygon(pixel_points, fill=255)
-        
-        result = Image.new('RGBA', (self.size, self.size), (0, 0, 0, 0))
-        result.paste(self.image, mask=mask)
-        
-        bbox = [
-            min(p[0] for p in pixel_points),
-            min(p[1] for p in pixel_points),
-            max(p[0] for p in pixel_points),
-            max(p[1] for p in pixel_points)
-        ]
-        result = result.crop(bbox)
+        pixel_points = self.grid_to_pixels(segment_id)
+        bbox = (*pixel_points.min(axis=0).tolist(), *pixel_points.max(axis=0).tolist())
+        result = self._extract_polygon(segment_id, bbox)
         
         if output_path:
             result.save(output_path)
@@ -462,7 +606,84 @@ class FortuneTellerProcessor:
     
 
 
-    def split_composite(self, composite_path: str, composite_id: str) -> Dict[str, Image.Image]:
+    @staticmethod
+    def _diagonal_split_masks(size: Tuple[int, int], split_angle: float, 
+                              overlap: int) -> Tuple[Image.Image, Image.Image]:
+        """
+        Build masks for the two halves of an image split by a line through its centre.
+        
+        The halves match what lies above and below the horizontal centre line once the
+        image is rotated counter-clockwise by split_angle, each grown by overlap pixels.
+        
+        Args:
+            size: (width, height) of the image being split
+            split_angle: Angle of the split in degrees
+            overlap: Pixels each half extends past the split line
+            
+        Returns:
+            Tuple of (top_mask, bottom_mask) L-mode images
+        """
+        angle = np.radians(split_angle)
+        center = np.array(size) / 2
+        direction = np.array([np.cos(angle), np.sin(angle)])  # along the split line
+        normal = np.array([np.sin(angle), -np.cos(angle)])    # towards the top half
+        reach = sum(size)  # far enough to cover the whole image
+        
+        def half_plane(near: float, far: float) -> List[Tuple[float, float]]:
+            corners = [
+                center - reach * direction + near * normal,
+                center + reach * direction + near * normal,
+                center + reach * direction + far * normal,
+                center - reach * direction + far * normal,
+            ]
+            return [tuple(corner) for corner in corners]
+        
+        top_mask = Image.new('L', size, 0)
+        bottom_mask = Image.new('L', size, 0)
+        ImageDraw.Draw(top_mask).polygon(half_plane(-overlap, reach), fill=255)
+        ImageDraw.Draw(bottom_mask).polygon(half_plane(overlap, -reach), fill=255)
+        return top_mask, bottom_mask
+
+    @staticmethod
+    def _half_plane_bbox(size: Tuple[int, int], center: np.ndarray, 
+                         normal: np.ndarray, offset: float) -> Tuple[int, int, int, int]:
+        """
+        Bound the part of an image where (p - center) . normal >= offset.
+        
+        The region is convex, so its extent is set by the image corners inside the
+        half-plane and by the points where the boundary line crosses the image edges.
+        
+        Args:
+            size: (width, height) of the image
+            center: Point the boundary line is measured from
+            normal: Unit normal pointing into the half-plane
+            offset: Signed distance of the boundary line from center
+            
+        Returns:
+            (left, top, right, bottom) pixel box
+        """
+        width, height = size
+        corners = np.array([(0, 0), (width, 0), (width, height), (0, height)], dtype=float)
+        # Move the boundary out a little to allow for polygon rasterization
+        distances = (corners - center) @ normal - (offset - 2)
+        
+        points = [corner for corner, distance in zip(corners, distances) if distance >= 0]
+        for i in range(4):
+            start, end = corners[i], corners[(i + 1) % 4]
+            d_start, d_end = distances[i], distances[(i + 1) % 4]
+            if d_start * d_end < 0:
+                points.append(start + (end - start) * d_start / (d_start - d_end))
+                
+        if not points:
+            return (0, 0, 0, 0)
+            
+        points = np.array(points)
+        left, top = np.floor(points.min(axis=0)).astype(int)
+        right, bottom = np.ceil(points.max(axis=0)).astype(int)
+        return (max(int(left), 0), max(int(top), 0), 
+                min(int(right), width), min(int(bottom), height))
+
+    def split_composite(self, composite_path: PathLike, composite_id: str) -> Dict[str, Image.Image]:
         """
         Split a composite image into its component segments with improved diagonal splitting.
         
@@ -476,8 +697,28 @@ class FortuneTellerProcessor:
         if composite_id not in self.COMPOSITE_DEFS:
             raise ValueError(f"Invalid composite ID: {composite_id}")
             
+        return self.split_composite_image(self.load_rgba(composite_path), composite_id)
+
+    def split_composite_image(self, composite: Image.Image, composite_id: str,
+                              target_sizes: Optional[Dict[str, Tuple[int, int]]] = None
+                              ) -> Dict[str, Image.Image]:
+        """
+        Split an already loaded composite image into its component segments.
+        
+        Args:
+            composite: PIL Image of the composite
+            composite_id: ID of the composite definition to use
+            target_sizes: Optional sizes, keyed by segment ID, to resize unrotated grid
+                and custom regions to while extracting them (default: native size)
+            
+        Returns:
+            Dictionary mapping segment IDs to their extracted images
+        """
+        if composite_id not in self.COMPOSITE_DEFS:
+            raise ValueError(f"Invalid composite ID: {composite_id}")
+            
         composite_def = self.COMPOSITE_DEFS[composite_id]
-        composite = Image.open(composite_path).convert('RGBA')
+        composite = _ensure_rgba(composite)
         width, height = composite.size
         
         if self.debug_dir:
@@ -486,71 +727,40 @@ class FortuneTellerProcessor:
         result_segments = {}
         
         if composite_def.split_type == SplitType.DIAGONAL:
-            # For diagonal splits, we need to handle the rotation carefully
-            split_angle = composite_def.split_rotation
-            
-            # Rotate the composite to align with split axis
-            rotated = composite.rotate(split_angle, expand=True, resample=Image.Resampling.BICUBIC)
-            rotated_width, rotated_height = rotated.size
-            
-            # Calculate split line position - use the center of the image
-            split_y = rotated_height // 2
-            
-            # Create masks for top and bottom segments
-            top_mask = Image.new('L', rotated.size, 0)
-            bottom_mask = Image.new('L', rotated.size, 0)
-            
-            # Draw split masks - use trapezoid shapes to avoid artifacts
-            draw_top = ImageDraw.Draw(top_mask)
-            draw_bottom = ImageDraw.Draw(bottom_mask)
-            
-            # Define split regions with slight overlap to prevent gaps
+            # The split is a line through the centre at split_rotation degrees, so
+            # mask each half in place rather than rotating the composite onto it
             overlap = 2  # pixels of overlap to prevent gaps
-            draw_top.rectangle([0, 0, rotated_width, split_y + overlap], fill=255)
-            draw_bottom.rectangle([0, split_y - overlap, rotated_width, rotated_height], fill=255)
-            
-            # Extract segments
-            top_segment = Image.new('RGBA', rotated.size, (0, 0, 0, 0))
-            bottom_segment = Image.new('RGBA', rotated.size, (0, 0, 0, 0))
+            top_mask, bottom_mask = self._diagonal_split_masks(
+                composite.size, composite_def.split_rotation, overlap
+            )
             
-            top_segment.paste(rotated, (0, 0), top_mask)
-            bottom_segment.paste(rotated, (0, 0), bottom_mask)
+            # Each half can only hold content inside its analytic bounding box
+            angle = np.radians(composite_def.split_rotation)
+            center = np.array(composite.size) / 2
+            normal = np.array([np.sin(angle), -np.cos(angle)])
+            top_box = self._half_plane_bbox(composite.size, center, normal, -overlap)
+            bottom_box = self._half_plane_bbox(composite.size, center, -normal, -overlap)
             
-            # Rotate segments back
-            top_segment = self.rotate_segment(
-                top_segment, 
-                -split_angle
-            )
-            bottom_segment = self.rotate_segment(
-                bottom_segment,
-                -split_angle
-            )
+            def extract_half(mask: Image.Image, box: Tuple[int, int, int, int]) -> Image.Image:
+                # Work on a canvas no larger than the half's box, then crop to content
+                half = Image.new('RGBA', (box[2] - box[0], box[3] - box[1]), (0, 0, 0, 0))
+                half.paste(composite.crop(box), (0, 0), mask.crop(box))
+                return self.crop_to_content(half)
             
-            # Crop to content
-            top_segment = self.crop_to_content(top_segment)
-            bottom_segment = self.crop_to_content(bottom_segment)
+            # Extract segments
+            top_segment = extract_half(top_mask, top_box)
+            bottom_segment = extract_half(bottom_mask, bottom_box)
             
-            # Map segments to their IDs based on composite definition
+            # The first segment in the definition is always the top half
             segment1_id, segment2_id = composite_def.segments[:2]
-            
-            # Determine correct segment assignment based on composite ID
-            if composite_id == 'combo_opt_1_6':
-                result_segments[segment1_id] = top_segment      # option_1
-                result_segments[segment2_id] = bottom_segment   # option_6
-            elif composite_id == 'combo_opt_2_5':
-                result_segments[segment1_id] = top_segment      # option_2
-                result_segments[segment2_id] = bottom_segment   # option_5
-            elif composite_id == 'combo_opt_3_8':
-                result_segments[segment1_id] = top_segment      # option_3
-                result_segments[segment2_id] = bottom_segment   # option_8
-            elif composite_id == 'combo_opt_4_7':
-                result_segments[segment1_id] = top_segment      # option_4
-                result_segments[segment2_id] = bottom_segment   # option_7
+            result_segments[segment1_id] = top_segment
+            result_segments[segment2_id] = bottom_segment
                 
-        elif composite_def.split_type == SplitType.GRID:
-            # For grid splits, use the defined regions
+        elif composite_def.split_type in (SplitType.GRID, SplitType.CUSTOM):
+            # Grid and custom splits differ only in how their regions are laid out,
+            # so both just extract the defined regions
             if not composite_def.regions:
-                raise ValueError(f"Grid split type requires defined regions for {composite_id}")
+                raise ValueError(f"{composite_def.split_type.name.title()} split type requires defined regions for {composite_id}")
                 
             for region in composite_def.regions:
                 # Convert normalized coordinates to pixels
@@ -560,34 +770,9 @@ class FortuneTellerProcessor:
                 bottom = int(region.bbox[3] * height)
                 
                 # Extract region
-                segment = composite.crop((left, top, right, bottom))
-                
-                # Apply any rotation specified for this region
-                if region.rotation != 0:
-                    segment = self.rotate_segment(segment, region.rotation)
-                
-                # Crop to content to remove any transparent padding
-                segment = self.crop_to_content(segment)
-                
-                result_segments[region.segment_id] = segment
-        elif composite_def.split_type == SplitType.CUSTOM:
-            # Add this new branch for custom split types
-            for region in composite_def.regions:
-                # Convert normalized coordinates to pixels
-                left = int(region.bbox[0] * width)
-                top = int(region.bbox[1] * height)
-                right = int(region.bbox[2] * width)
-                bottom = int(region.bbox[3] * height)
-                
-                # Extract region
-                segment = composite.crop((left, top, right, bottom))
-                
-                # Apply any rotation specified for this region
-                if region.rotation != 0:
-                    segment = self.rotate_segment(segment, region.rotation)
-                
-                # Crop to content to remove any transparent padding
-                segment = self.crop_to_content(segment)
+                target_size = target_sizes.get(region.segment_id) if target_sizes else None
+                segment = self._extract_region(composite, (left, top, right, bottom), 
+                                               region, target_size)
                 
                 result_segments[region.segment_id] = segment
 
@@ -597,144 +782,276 @@ class FortuneTellerProcessor:
                 self.save_debug_image(image, f"{composite_id}_{segment_id}")
         
         return result_segments
-    def reconstruct_from_composites(self, composites_dir: str, output_path: Optional[str] = None) -> Image:
+
+    def _extract_region(self, composite: Image.Image, box: Tuple[int, int, int, int], 
+                        region: SplitRegion, 
+                        target_size: Optional[Tuple[int, int]] = None) -> Image.Image:
+        """
+        Cut a split region out of a composite, cropped to its content.
+        
+        When a target size is given and the region has no rotation, the content box is
+        found first so the crop and the resize to target size happen in one resample.
+        
+        Args:
+            composite: RGBA composite image
+            box: (left, top, right, bottom) pixel box of the region
+            region: Region definition
+            target_size: Optional (width, height) to resize the region to
+            
+        Returns:
+            Extracted PIL Image
+        """
+        if target_size is None or region.rotation % 360 != 0:
+            # Apply any rotation specified for this region
+            segment = self.rotate_segment(composite.crop(box), region.rotation)
+            
+            # Crop to content to remove any transparent padding
+            return self.crop_to_content(segment)
+            
+        content = composite.crop(box).getchannel('A').getbbox()
+        if content is None:
+            return composite.crop(box)
+            
+        left, top = box[:2]
+        content_box = (left + content[0], top + content[1], left + content[2], top + content[3])
+        return composite.resize(target_size, self.resample, box=content_box)
+
+    def reconstruct_from_composites(self, composites_dir: PathLike, output_path: Optional[PathLike] = None) -> Image:
         """
         Reconstruct fortune teller from composite images with enhanced debugging and fixes.
         """
         composites_path = Path(composites_dir)
+        composites = {}
+        
+        for composite_id in self.COMPOSITE_DEFS:
+            composite_path = composites_path / f'{composite_id}.png'
+            if composite_path.exists():
+                composites[composite_id] = self.load_rgba(composite_path)
+        
+        return self.reconstruct_from_composite_images(composites, output_path)
+
+    def reconstruct_from_composite_images(self, composites: Dict[str, Image.Image], 
+                                          output_path: Optional[PathLike] = None) -> Image:
+        """Reconstruct fortune teller from in-memory composite images keyed by composite ID."""
         template = Image.new('RGBA', (self.size, self.size), (0, 0, 0, 0))
         
         processed_segments = set()
         
+        # Regions are placed at these sizes anyway, so splitting can resize in the same pass
+        target_sizes = {segment_id: geometry.target_size 
+                        for segment_id, geometry in self.segment_geometry.items()}
+        
+        def split(composite_id):
+            # Errors are handed back so they are reported with their composite below
+            try:
+                return self.split_composite_image(composites[composite_id], composite_id, 
+                                                  target_sizes)
+            except Exception as e:
+                return e
+        
+        # Split all composites in parallel; placement stays serial as it writes the template
+        available = [composite_id for composite_id in self.COMPOSITE_DEFS 
+                     if composites.get(composite_id) is not None]
+        split_results = dict(zip(available, self._parallel_map(split, available)))
+        
         # Process each composite type
         for composite_id, composite_def in self.COMPOSITE_DEFS.items():
-            composite_path = composites_path / f'{composite_id}.png'
-            if not composite_path.exists():
-                print(f"Warning: Missing composite image: {composite_path}")
+            if composite_id not in split_results:
+                logger.warning("Missing composite image: %s", composite_id)
                 continue
                 
-            print(f"\nProcessing composite: {composite_id}")
+            logger.debug("Processing composite: %s", composite_id)
             try:
-                # Split the composite into its segments
-                segments = self.split_composite(str(composite_path), composite_id)
-                print(f"Split into {len(segments)} segments: {list(segments.keys())}")
+                # Take the composite's split segments
+                segments = split_results[composite_id]
+                if isinstance(segments, Exception):
+                    raise segments
+                logger.debug("Split into %d segments: %s", len(segments), list(segments))
                 
                 # Place each segment from the split composite
                 for segment_id, segment_image in segments.items():
                     if segment_id in processed_segments:
-                        print(f"Segment {segment_id} already processed, skipping...")
+                        logger.debug("Segment %s already processed, skipping", segment_id)
                         continue
                     
-                    print(f"\nPlacing segment {segment_id}:")
-                    print(f"- Original size: {segment_image.size}")
-                    
-                    # Get segment definition
+                    # Get segment definition and precomputed geometry
                     segment_def = self.SEGMENT_DEFS[segment_id]
+                    geometry = self.segment_geometry[segment_id]
                     
-                    # Calculate expected size based on grid points with scaling
-                    points = segment_def.points
-                    min_x = min(p[0] for p in points)
-                    max_x = max(p[0] for p in points)
-                    min_y = min(p[1] for p in points)
-                    max_y = max(p[1] for p in points)
-                    
-                    if segment_id != 'big_diamond':
-                        expected_width = int((max_x - min_x) * self.size * segment_def.scale / 4)
-                        expected_height = int((max_y - min_y) * self.size * segment_def.scale / 4)
-                    else:
-                        expected_width = int((max_x - min_x) * self.size / 4)
-                        expected_height = int((max_y - min_y) * self.size / 4)
-                        
-                    print(f"- Expected size: {expected_width}x{expected_height}")
-                    
-                    # Resize if needed
-                    if segment_image.size != (expected_width, expected_height):
-                        segment_image = segment_image.resize(
-                            (expected_width, expected_height), 
-                            Image.Resampling.LANCZOS
-                        )
-                        print(f"- Resized to: {segment_image.size}")
+                    # Expected size based on grid points with scaling
+                    expected_width, expected_height = geometry.target_size
+                    logger.debug("Placing segment %s: original size %s, expected %dx%d",
+                                 segment_id, segment_image.size, expected_width, expected_height)
                     
                     # Get placement position with scaling and offset
-                    grid_x, grid_y = self.get_anchor_coordinates(segment_def)
-                    pixel_x, pixel_y = self.grid_to_pixel(grid_x, grid_y, segment_id)
-                    print(f"- Base position: ({int(grid_x * self.size / 4)}, {int(grid_y * self.size / 4)})")
-                    print(f"- Adjusted position with scale={segment_def.scale}, offset={segment_def.offset}: ({pixel_x}, {pixel_y})")
-                    
-                    # Apply default rotation if specified
-                    if segment_def.default_rotation != 0:
-                        print(f"- Applying default rotation: {segment_def.default_rotation}°")
-                        segment_image = self.rotate_segment(segment_image, segment_def.default_rotation)
+                    pixel_x, pixel_y = geometry.pixel_anchor
+                    logger.debug("- Position with scale=%s, offset=%s: (%d, %d), rotation %s°",
+                                 segment_def.scale, segment_def.offset, pixel_x, pixel_y,
+                                 segment_def.default_rotation)
                     
-                    # Create temporary image to check placement
-                    temp = template.copy()
-                    temp.alpha_composite(segment_image, (pixel_x, pixel_y))
-                    
-                    # Update template and mark as processed
-                    template = temp
+                    # Resize and rotate in one transform, composite straight into the template
+                    self.place_segment(template, segment_image, segment_id)
                     processed_segments.add(segment_id)
-                    print(f"✓ Successfully placed {segment_id}")
-                    
-                    # Save debug output
-                    if self.debug_dir:
-                        debug_path = self.debug_dir / f"debug_placed_{segment_id}.png"
-                        template.save(debug_path)
-                        print(f"- Saved debug image: {debug_path}")
+                
+                # Save debug output once per composite
+                self.save_debug_image(template, f"placed_{composite_id}")
             
-            except Exception as e:
-                print(f"Error processing composite {composite_id}: {str(e)}")
-                import traceback
-                traceback.print_exc()
+            except Exception:
+                logger.exception("Error processing composite %s", composite_id)
                 continue
         
         # Check for missing segments
         all_segments = set(self.SEGMENT_DEFS.keys())
         missing_segments = all_segments - processed_segments
         if missing_segments:
-            print(f"\nWarning: Missing segments: {missing_segments}")
+            logger.warning("Missing segments: %s", missing_segments)
         
         if output_path:
             template.save(output_path)
-            print(f"\nSaved final reconstruction to {output_path}")
+            logger.debug("Saved final reconstruction to %s", output_path)
         
         return template
             
     @staticmethod
-    def crop_to_content(image: Image.Image, padding: int = 0) -> Image.Image:
+    def _parallel_map(func, items) -> list:
+        """
+        Map func over items on a thread pool, preserving order.
+        
+        PIL releases the GIL inside its C routines, so threads give real parallelism
+        for per-segment work. Tiny batches run inline, where starting a pool would
+        cost more than it saves.
+        """
+        items = list(items)
+        if len(items) <= 2:
+            return [func(item) for item in items]
+            
+        with ThreadPoolExecutor(max_workers=min(len(items), os.cpu_count() or 1)) as pool:
+            return list(pool.map(func, items))
+
+    @staticmethod
+    def open_image(image_path: PathLike) -> Image.Image:
+        """
+        Open and decode an image from a read-only memory map of the file.
+        
+        Lets the page cache own the encoded bytes instead of reading them onto the heap.
+        
+        Args:
+            image_path: Path to the image file
+            
+        Returns:
+            Fully loaded PIL Image
+        """
+        with open(image_path, 'rb') as f:
+            # Empty files cannot be mapped; reject them with PIL's usual error
+            if os.fstat(f.fileno()).st_size == 0:
+                raise UnidentifiedImageError(f"cannot identify image file {str(image_path)!r}")
+                
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                image = Image.open(mapped)
+                image.load()
+        return image
+
+    @classmethod
+    def load_rgba(cls, image_path: PathLike) -> Image.Image:
+        """
+        Load an image as RGBA, reusing the decoded result while the file is unchanged.
+        
+        The returned image is shared between callers and must not be modified in place.
+        """
+        image_path = Path(image_path)
+        return cls._load_rgba_cached(str(image_path), image_path.stat().st_mtime_ns)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=32)
+    def _load_rgba_cached(image_path: str, mtime_ns: int) -> Image.Image:
+        """Decode and convert an image; keyed on mtime so edited files are reloaded."""
+        if pyvips is not None:
+            vips_image = pyvips.Image.new_from_file(image_path, access='sequential')
+            
+            # Only 8-bit sRGB is taken from libvips; anything else goes through
+            # Pillow so the result always matches convert('RGBA')
+            if vips_image.format == 'uchar' and vips_image.interpretation == 'srgb' \
+                    and vips_image.bands in (3, 4):
+                if vips_image.bands == 3:
+                    vips_image = vips_image.bandjoin(255)
+                return Image.frombytes('RGBA', (vips_image.width, vips_image.height), 
+                                       vips_image.write_to_memory())
+                
+        image = Image.open(image_path)
+        if image.mode == 'RGBA':
+            # load() reads the pixels and releases the file, so no copy is needed
+            image.load()
+            return image
+            
+        with image:
+            return image.convert('RGBA')
+
+    @staticmethod
+    def to_palette(image: Image.Image) -> Optional[Image.Image]:
+        """
+        Losslessly convert an image with at most 256 distinct colors to palette mode.
+        
+        Args:
+            image: PIL Image to convert
+            
+        Returns:
+            Palette ('P') image with an RGBA palette, or None if the image has too many colors
+        """
+        if image.getcolors(maxcolors=256) is None:
+            return None
+            
+        image = _ensure_rgba(image)
+        rgba = np.asarray(image)
+        packed = rgba.view(np.uint32).reshape(rgba.shape[:2])
+        colors, indices = np.unique(packed, return_inverse=True)
+        
+        paletted = Image.fromarray(indices.reshape(packed.shape).astype(np.uint8), 'P')
+        paletted.putpalette(colors.view(np.uint8).tobytes(), rawmode='RGBA')
+        return paletted
+
+    @staticmethod
+    def crop_to_content(image: Image.Image, padding: int = 0, 
+                        alpha: Optional[Image.Image] = None) -> Image.Image:
         """
         Crop image to its non-transparent content with improved edge handling.
         
         Args:
             image: PIL Image in RGBA mode
             padding: Optional padding around the cropped content (default: 0)
+            alpha: Optional alpha band of image already in hand, as an L image, so
+                it is not extracted again (default: read from image)
             
         Returns:
             Cropped PIL Image
         """
         # Ensure image is in RGBA mode
-        if image.mode != 'RGBA':
-            image = image.convert('RGBA')
+        image = _ensure_rgba(image)
         
-        # Convert to numpy array for faster processing
-        rgba = np.array(image)
+        # Only the alpha band is needed, so convert just that to numpy
+        if alpha is None:
+            alpha = image.getchannel('A')
+        alpha = np.asarray(alpha)
         
-        # Check if image is completely transparent
-        if not rgba[:, :, 3].any():
-            return image
-        
-        # Find non-transparent pixels
-        alpha = rgba[:, :, 3]
-        y_nonzero, x_nonzero = np.nonzero(alpha)
+        # Find rows and columns holding non-transparent pixels
+        rows = alpha.any(axis=1)
         
-        # Handle empty image case
-        if len(y_nonzero) == 0 or len(x_nonzero) == 0:
+        # Check if image is completely transparent, using the per-row flags
+        # rather than another pass over alpha
+        if not rows.any():
             return image
+            
+        cols = alpha.any(axis=0)
         
-        # Calculate bounds with padding
-        min_y = max(0, np.min(y_nonzero) - padding)
-        max_y = min(rgba.shape[0], np.max(y_nonzero) + 1 + padding)
-        min_x = max(0, np.min(x_nonzero) - padding)
-        max_x = min(rgba.shape[1], np.max(x_nonzero) + 1 + padding)
+        # Calculate bounds with padding, as plain ints rather than numpy scalars
+        top = int(rows.argmax())
+        bottom = len(rows) - int(rows[::-1].argmax())
+        left = int(cols.argmax())
+        right = len(cols) - int(cols[::-1].argmax())
+        
+        min_y = max(0, top - padding)
+        max_y = min(image.height, bottom + padding)
+        min_x = max(0, left - padding)
+        max_x = min(image.width, right + padding)
         
         # Ensure we have valid bounds
         if min_x >= max_x or min_y >= max_y:
@@ -750,6 +1067,11 @@ class FortuneTellerProcessor:
         """
         Rotate a segment with improved quality and alpha handling.
         
+        Multiples of 360 return the image unchanged. Multiples of 90 use an exact
+        transpose, which needs no resampling and so is both faster and lossless;
+        any other angle is resampled, cropped to content and its alpha thresholded.
+        All rotations in the pipeline go through here.
+        
         Args:
             image: PIL Image to rotate
             angle: Rotation angle in degrees
@@ -760,42 +1082,44 @@ class FortuneTellerProcessor:
             Rotated PIL Image
         """
         # Skip if no rotation needed
+        angle = angle % 360
         if angle == 0:
             return image
             
         # Ensure image is in RGBA mode
-        if image.mode != 'RGBA':
-            image = image.convert('RGBA')
-        
-        # Calculate the center of rotation
-        center = (image.width // 2, image.height // 2)
-        
-        # Add padding before rotation to prevent content clipping
-        padding = int(max(image.width, image.height) * 0.1)  # 10% padding
-        padded = Image.new('RGBA', 
-                          (image.width + 2*padding, image.height + 2*padding),
-                          (0, 0, 0, 0))
-        padded.paste(image, (padding, padding))
-        
-        # Perform rotation with high-quality settings
-        rotated = padded.rotate(
-            angle,
-            resample=resample,
-            expand=expand,
-            center=(padded.width//2, padded.height//2)
-        )
+        image = _ensure_rgba(image)
         
-        # Crop to content
-        result = FortuneTellerProcessor.crop_to_content(rotated)
+        # Right angles are a plain transpose (a quarter turn only fits when expanding)
+        transpose = FortuneTellerProcessor.RIGHT_ANGLE_TRANSPOSES.get(angle)
+        if transpose is not None and (expand or angle == 180):
+            return image.transpose(transpose)
+        
+        if expand:
+            # expand=True already sizes the canvas to the whole rotated image
+            rotated = image.rotate(angle, resample=resample, expand=True)
+        else:
+            # Add padding before rotation to prevent content clipping
+            padding = int(max(image.width, image.height) * 0.1)  # 10% padding
+            padded = Image.new('RGBA', 
+                              (image.width + 2*padding, image.height + 2*padding),
+                              (0, 0, 0, 0))
+            padded.paste(image, (padding, padding))
+            
+            # Perform rotation with high-quality settings
+            rotated = padded.rotate(
+                angle,
+                resample=resample,
+                expand=False,
+                center=(padded.width//2, padded.height//2)
+            )
         
-        # Apply threshold to alpha channel to clean up semi-transparent pixels
-        rgba = np.array(result)
-        alpha = rgba[:, :, 3]
-        alpha[alpha < 128] = 0  # Set low-alpha pixels to fully transparent
-        alpha[alpha >= 128] = 255  # Set high-alpha pixels to fully opaque
-        rgba[:, :, 3] = alpha
+        # Apply threshold to alpha channel to clean up semi-transparent pixels;
+        # only the alpha band is touched, through a lookup table
+        alpha = rotated.getchannel('A').point(FortuneTellerProcessor.BINARY_ALPHA_LUT)
+        rotated.putalpha(alpha)
         
-        return Image.fromarray(rgba)
+        # Crop to content, reusing the thresholded alpha rather than reading it again
+        return FortuneTellerProcessor.crop_to_content(rotated, alpha=alpha)
         
     @staticmethod
     def clean_edges(image: Image.Image, threshold: int = 128) -> Image.Image:
@@ -809,21 +1133,29 @@ class FortuneTellerProcessor:
         Returns:
             Cleaned PIL Image
         """
-        rgba = np.array(image)
-        alpha = rgba[:, :, 3]
+        image = _ensure_rgba(image)
+        alpha = image.getchannel('A')
         
-        # Create mask of semi-transparent pixels
-        semi_transparent = (alpha > 0) & (alpha < threshold)
-        
-        # Set semi-transparent pixels to fully transparent
-        rgba[semi_transparent, 3] = 0
-        
-        # Set color values of transparent pixels to black
-        # (prevents color bleeding in some image viewers)
-        transparent = alpha == 0
-        rgba[transparent, 0:3] = 0
+        # Nothing below the threshold means nothing to clean; a transparent pixel
+        # still needs its color zeroed, so this only holds without any of those
+        if alpha.getextrema()[0] >= max(threshold, 1):
+            return image
+            
+        # Semi-transparent pixels become fully transparent, and every transparent
+        # pixel gets black color values (prevents color bleeding in some image
+        # viewers), so copy only the kept pixels onto a zeroed canvas
+        keep = alpha.point(FortuneTellerProcessor._keep_alpha_lut(threshold))
+        result = Image.new('RGBA', image.size, (0, 0, 0, 0))
+        result.paste(image, (0, 0), keep)
         
-        return Image.fromarray(rgba)
+        return result
+
+    @staticmethod
+    @functools.lru_cache(maxsize=8)
+    def _keep_alpha_lut(threshold: int) -> List[int]:
+        """Lookup table mapping alpha to a binary mask of pixels clean_edges keeps."""
+        threshold = max(threshold, 1)
+        return [0 if value < threshold else 255 for value in range(256)]
 
     def process_segment(self, segment: Image.Image, 
                        rotation: float = 0, 
@@ -840,12 +1172,10 @@ class FortuneTellerProcessor:
             Processed PIL Image
         """
         # Ensure RGBA mode
-        if segment.mode != 'RGBA':
-            segment = segment.convert('RGBA')
+        segment = _ensure_rgba(segment)
         
         # Apply rotation if needed
-        if rotation != 0:
-            segment = self.rotate_segment(segment, rotation)
+        segment = self.rotate_segment(segment, rotation)
         
         # Crop to content
         segment = self.crop_to_content(segment)
@@ -856,42 +1186,59 @@ class FortuneTellerProcessor:
         
         return segment
 
-    def split_all_composites(self, input_dir: str, output_dir: str):
+    def split_all_composites(self, input_dir: PathLike, output_dir: PathLike):
         """Split all composite images into their component segments."""
         input_path = Path(input_dir)
         output_path = Path(output_dir)
         output_path.mkdir(parents=True, exist_ok=True)
         
-        for composite_id, composite_def in self.COMPOSITE_DEFS.items():
+        def split_and_save(composite_id):
             composite_path = input_path / f'{composite_id}.png'
             if not composite_path.exists():
-                print(f"Warning: Missing composite image: {composite_path}")
-                continue
+                return composite_path
             
             segments = self.split_composite(str(composite_path), composite_id)
             
             for segment_id, image in segments.items():
                 image.save(output_path / f'{segment_id}.png')
+        
+        # Composites are independent, so they are split and saved in parallel
+        for missing_path in self._parallel_map(split_and_save, self.COMPOSITE_DEFS):
+            if missing_path is not None:
+                print(f"Warning: Missing composite image: {missing_path}")
     
-    def reconstruct(self, input_dir: str, output_path: Optional[str] = None) -> Image:
+    def reconstruct(self, input_dir: PathLike, output_path: Optional[PathLike] = None) -> Image:
         """Reconstruct fortune teller from individual segments."""
         input_path = Path(input_dir)
-        template = Image.new('RGBA', (self.size, self.size), (0, 0, 0, 0))
+        images = {}
         
         for segment_id in self.SEGMENT_DEFS:
             segment_path = input_path / f'{segment_id}.png'
-            if not segment_path.exists():
-                print(f"Warning: Missing segment image: {segment_path}")
+            if segment_path.exists():
+                images[segment_id] = self.load_rgba(segment_path)
+        
+        return self.reconstruct_from_images(images, output_path)
+
+    def reconstruct_from_images(self, images: Dict[str, Image.Image], 
+                                output_path: Optional[PathLike] = None) -> Image:
+        """Reconstruct fortune teller from in-memory segment images keyed by segment ID."""
+        template = Image.new('RGBA', (self.size, self.size), (0, 0, 0, 0))
+        
+        for segment_id in self.SEGMENT_DEFS:
+            segment = images.get(segment_id)
+            if segment is None:
+                logger.warning("Missing segment image: %s", segment_id)
                 continue
                 
-            segment = Image.open(segment_path).convert('RGBA')
+            segment = _ensure_rgba(segment)
             template = self.place_segment(template, segment, segment_id)
         
         if output_path:
             template.save(output_path)
             
-            return templat
-    def generate_all_composites(self, output_dir: str = '.'):
+        return template
+
+    def generate_all_composites(self, output_dir: PathLike = '.'):
         """Generate all composites including both option pairs and flaps."""
         output_path = Path(output_dir)
         output_path.mkdir(parents=True, exist_ok=True)
@@ -907,17 +1254,28 @@ class FortuneTellerProcessor:
         print("\nGenerating composites:")
         print(f"Output directory: {output_path.absolute()}")
         
-        for opt1, opt2, rot1, rot2 in option_configs:
+        def create_and_save(config):
+            # Errors are handed back so they are reported in order below
+            opt1, opt2, rot1, rot2 = config
             try:
                 composite = self.create_composite(opt1, opt2, rot1, rot2)
-                output_name = f'combo_opt_{opt1}_{opt2}.png'
-                output_file = output_path / output_name
-                composite.save(output_file)
-                print(f"✓ Created {output_name} ({output_file.absolute()})")
-                # Debug: print size and mode of generated composite
-                print(f"  Size: {composite.size}, Mode: {composite.mode}")
+                composite.save(output_path / f'combo_opt_{opt1}_{opt2}.png')
+                return composite
             except Exception as e:
-                print(f"✗ Failed to generate option composite {opt1}_{opt2}: {str(e)}")
+                return e
+        
+        # Option pairs are independent, so they are built and saved in parallel
+        results = self._parallel_map(create_and_save, option_configs)
+        for (opt1, opt2, _, _), composite in zip(option_configs, results):
+            if isinstance(composite, Exception):
+                print(f"✗ Failed to generate option composite {opt1}_{opt2}: {str(composite)}")
+                continue
+                
+            output_name = f'combo_opt_{opt1}_{opt2}.png'
+            output_file = output_path / output_name
+            print(f"✓ Created {output_name} ({output_file.absolute()})")
+            # Debug: print size and mode of generated composite
+            print(f"  Size: {composite.size}, Mode: {composite.mode}")
 
         try:
             print("\nGenerating flap composite:")
@@ -951,6 +1309,9 @@ class FortuneTellerProcessor:
 
 def main():
     """Example usage demonstrating extraction, composite splitting, and reconstruction."""
+    logging.basicConfig(format='%(message)s')
+    logger.setLevel(logging.DEBUG)
+    
     # Extract all segments from original image
     processor = FortuneTellerProcessor('fortune_teller.png')
     processor.enable_debug('debug_output')
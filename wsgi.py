@@ -0,0 +1,2 @@
+"""WSGI entry point, e.g. `gunicorn -k gthread -w 4 --threads 8 -b 0.0.0.0:5000 wsgi:app`"""
+from app import app